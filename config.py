@@ -1,8 +1,8 @@
 # config.py
-from dataclasses import dataclass, field
-from typing import Dict, List
+from dataclasses import dataclass
+from typing import Tuple
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class DeliveryConfig:
     """
     城际物流系统参数配置类
@@ -14,10 +14,10 @@ class DeliveryConfig:
     travel_time_periods: int = 4  # tau:driving time between cities 1 and 2
 
     # --- 2. 载荷参数 ---
-    # N^i: number of available vehicles for city i\in{1,2}
-    N_manual: Dict[int, int] = field(default_factory=lambda: {1: 30, 2: 30}) 
-    # hat{N}^i: number of availabe automated vehicles
-    N_auto: Dict[int, int] = field(default_factory=lambda: {1: 15, 2: 15})
+    # N^i: number of available vehicles for city i\in{1,2}, 存为 (城市1, 城市2), 城市 i 对应下标 i-1
+    N_manual: Tuple[int, int] = (30, 30)
+    # hat{N}^i: number of availabe automated vehicles, 同上
+    N_auto: Tuple[int, int] = (15, 15)
     
     # M: capacity of manually driven vehicles
     capacity_manual: float = 1000.0  # 如果是乘客数目应该是int
@@ -1,10 +1,10 @@
 # data_loader.py
 import math
+import numpy as np
 from dataclasses import dataclass
-from typing import List, Tuple, Dict
+from typing import List, Tuple, Dict, NamedTuple
 from config import DeliveryConfig
 from functools import lru_cache
-from typing import Iterator
 
 
 @dataclass
@@ -15,11 +15,10 @@ class DeliveryData:
     arcs_manual_2: List[Tuple[int, int]]       # A^2: 城市2中人工车辆所有可能的时间弧 (i, j)
     arcs_auto: List[Tuple[int, int]]         # hat{A}: 自动驾驶车辆所有可能的时间弧 (i, j)
     
-    # 状态映射 S^k(t) 和 hat{S}(t)
-    # key: 时间点 t, value: 覆盖该时间点的路径列表 [(i, j), ...]
-    sets_manual_1: Dict[int, List[Tuple[int, int]]]
-    sets_manual_2: Dict[int, List[Tuple[int, int]]]
-    sets_auto: Dict[int, List[Tuple[int, int]]]
+    # 状态映射 S^k(t) 和 hat{S}(t), CSR 形式 (见 ArcSets)
+    sets_manual_1: "ArcSets"
+    sets_manual_2: "ArcSets"
+    sets_auto: "ArcSets"
     
     # 预计算参数
     # key: (i, j), value: 对应路径的最大载重量 (公式6右侧部分)
@@ -31,23 +30,37 @@ class DeliveryData:
     neg_orders: Dict[int, List[int]]  # 反向订单集合
     all_orders: Dict[int, List[int]]  # 所有订单集合
 
-    # the set of time pairs that violate the time-window constraints
-    epsilon_sets: List[Tuple[int, int, str, int]]
-    
+# 决定时间弧、S(t) 集合与载重系数的配置字段; 车队规模与成本不影响这些结构
+# 字段名与 DeliveryConfig 保持一致
+class StructuralKey(NamedTuple):
+    T: int
+    t_0: float
+    travel_time_periods: int
+    capacity_manual: float
+    service_a_1: float
+    service_b_1: float
+    service_a_2: float
+    service_b_2: float
+
+# S(t) 的 CSR 表示: indices[indptr[t]:indptr[t+1]] 为覆盖时间点 t 的弧在对应弧列表中的下标
+class ArcSets(NamedTuple):
+    indptr: np.ndarray    # (T+1,) int32
+    indices: np.ndarray   # (覆盖次数总和,) int32
+
 class DataLoader:
     def __init__(self, config: DeliveryConfig):
         self.cfg = config
+
+    def structural_key(self) -> StructuralKey:
+        return StructuralKey(**{name: getattr(self.cfg, name) for name in StructuralKey._fields})
     # 为城市1的BHH近似
-    @lru_cache(maxsize=1024)
     def BHH_function_1(self, load: float) -> float:
         return self.cfg.service_a_1 * load + self.cfg.service_b_1 * math.sqrt(load)
     # 为城市2的BHH近似
-    @lru_cache(maxsize=1024)
     def BHH_function_2(self, load: float) -> float:
         return self.cfg.service_a_2 * load + self.cfg.service_b_2 * math.sqrt(load)
 
     # 为城市1的反函数
-    @lru_cache(maxsize=1024)
     def inverse_function_1(self, duration_minutes: float) -> float:
         """
         求解反函数 (f^1)^(-1)(T)。
@@ -65,7 +78,6 @@ class DataLoader:
         return u**2
     
     # 为城市2的反函数
-    @lru_cache(maxsize=1024)
     def inverse_function_2(self, duration_minutes: float) -> float:
         """
         求解反函数 (f^2)^(-1)(T)。
@@ -81,106 +93,102 @@ class DataLoader:
         delta = b**2 + 4 * a * T_val
         u = (-b + math.sqrt(delta)) / (2 * a)
         return u**2
-     # 人工车辆:  j > i 且 j <= i+f^k(M) 即可
-    def _generate_single_city_arcs(self, service_func) -> Iterator[Tuple[int, int]]:
-        for i in range(self.cfg.T):
-            limit = i + int(service_func(self.cfg.capacity_manual))
-            for j in range(i + 1, limit):
-                yield (i, j)  
+     # 人工车辆:  j > i 且 j < i+window 即可, window = int(f^k(M)) 与 i 无关
+    # 返回 (N, 2) 的 int32 弧数组, 按 i、j 升序排列
+    def _generate_single_city_arcs(self, window: int) -> np.ndarray:
+        span = max(window - 1, 0)
+        i = np.repeat(np.arange(self.cfg.T, dtype=np.int32), span)
+        j = i + np.tile(np.arange(1, span + 1, dtype=np.int32), self.cfg.T)
+        return np.stack([i, j], axis=1)
 
     def generate_arcs_manual(self):
-        iter_1 = list(self._generate_single_city_arcs(self.BHH_function_1))
-        iter_2 = list(self._generate_single_city_arcs(self.BHH_function_2))
-        return iter_1, iter_2
+        arcs_1, arcs_2 = self._manual_arc_arrays()
+        return _arcs_to_list(arcs_1), _arcs_to_list(arcs_2)
+
+    def _manual_arc_arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        window_1 = int(self.BHH_function_1(self.cfg.capacity_manual))
+        window_2 = int(self.BHH_function_2(self.cfg.capacity_manual))
+        return self._generate_single_city_arcs(window_1), self._generate_single_city_arcs(window_2)
     
      # 自动驾驶车辆: 固定行驶时间 tau
     def generate_arcs_auto(self) -> List[Tuple[int, int]]:
+        return _arcs_to_list(self._auto_arc_array())
+
+    def _auto_arc_array(self) -> np.ndarray:
         # j = i + tau
-        arcs_auto = []
         tau = self.cfg.travel_time_periods
-        for i in range(self.cfg.T - tau + 1):
-            j = i + tau
-            arcs_auto.append((i, j))
-        return arcs_auto
+        i = np.arange(max(self.cfg.T - tau + 1, 0), dtype=np.int32)
+        return np.stack([i, i + tau], axis=1)
+
+    # 一次调用生成模型所需的全部集合与参数, 按结构键缓存
+    # 返回 (arcs_manual_1, arcs_manual_2, arcs_auto, sets_manual_1, sets_manual_2, sets_auto,
+    #       cap_coeff_1, cap_coeff_2)
+    # 订单时间窗不可行的 (弧, 订单) 组合 (原 epsilon 集合) 由 Optimizer.setup_variables 直接判断, 不在此生成
+    def build_structural(self):
+        return _load_structural(self.structural_key())
+
+    # 每类弧只生成一次 (N, 2) 数组, 载重系数与 S(t) 集合直接在同一数组上计算
+    def _build_arc_structures(self):
+        arr_1, arr_2 = self._manual_arc_arrays()
+        arr_auto = self._auto_arc_array()
+        arcs_manual_1 = _arcs_to_list(arr_1)
+        arcs_manual_2 = _arcs_to_list(arr_2)
+        arcs_auto = _arcs_to_list(arr_auto)
+
+        sets_manual_1, sets_manual_2, sets_auto = self.generate_sets(arr_1, arr_2, arr_auto)
+        cap_coeff_1, cap_coeff_2 = self.pre_inverse_count(arcs_manual_1, arcs_manual_2)
+
+        return (arcs_manual_1, arcs_manual_2, arcs_auto,
+                sets_manual_1, sets_manual_2, sets_auto,
+                cap_coeff_1, cap_coeff_2)
     # 生成S^k(t)和\hat{S}(t)
     def generate_sets(self, arcs_manual_1, arcs_manual_2, arcs_auto):
-      
-        sets_manual_1 = {t: [] for t in range(self.cfg.T)}    
-        for (i, j) in arcs_manual_1:
-            for t in range(i, j):
-                if t < self.cfg.T:
-                    sets_manual_1[t].append((i, j))
-
-        sets_manual_2 = {t: [] for t in range(self.cfg.T)}
-        for (i, j) in arcs_manual_2:
-            for t in range(i, j):
-                if t < self.cfg.T:
-                    sets_manual_2[t].append((i, j))
-
-        sets_auto = {t: [] for t in range(self.cfg.T)}
-        for (i, j) in arcs_auto:
-            for t in range(i, j):
-                if t < self.cfg.T:
-                    sets_auto[t].append((i, j))
-
+        sets_manual_1 = self._active_sets(arcs_manual_1)
+        sets_manual_2 = self._active_sets(arcs_manual_2)
+        sets_auto = self._active_sets(arcs_auto)
         return sets_manual_1, sets_manual_2, sets_auto
-    # 生成约束七中所出现的集合epsilon
-    def generate_epsilon_sets(self, pos_orders, neg_orders, arcs_manual_1, arcs_manual_2):
-        
-        infeasible_sets = []
-
-        # 1. 处理正向订单 (City 1 -> City 2)
-        for l, order in pos_orders.items():
-            # 出发太早 (i < s_l)
-           
-            infeasible_sets.extend([
-                (i, j, 1, "+", l)  
-                for (i, j) in arcs_manual_1
-                if i < order.earliest_start  
-            ])
-            # 到达太晚 (j > e_l)
-            infeasible_sets.extend([
-                (i, j, 2, "+", l)  
-                for (i, j) in arcs_manual_2
-                if j > order.latest_completion 
-            ])
-
-        # 2. 处理反向订单 (City 2 -> City 1)
-        for l, order in neg_orders.items():
-            # 出发太早
-            infeasible_sets.extend([
-                (i, j, 2, "-", l)  
-                for (i, j) in arcs_manual_2   
-                if i < order.earliest_start   
-            ])
-            # 到达太晚
-            infeasible_sets.extend([
-                (i, j, 1, "-", l) 
-                for (i, j) in arcs_manual_1   
-                if j > order.latest_completion 
-            ])
-                
-        return infeasible_sets
+
+    # 覆盖矩阵 cover[t, k] = (i_k <= t < j_k), 每一行的非零位置即为时间点 t 的活跃弧
+    # 先按行计数得到 indptr, 再按行优先顺序写出弧下标
+    def _active_sets(self, arcs) -> ArcSets:
+        arcs = np.asarray(arcs, dtype=np.int32).reshape(-1, 2)
+        t = np.arange(self.cfg.T)[:, None]
+        cover = (arcs[:, 0][None, :] <= t) & (t < arcs[:, 1][None, :])
+        indptr = np.zeros(self.cfg.T + 1, dtype=np.int32)
+        np.cumsum(cover.sum(axis=1), out=indptr[1:])
+        indices = np.nonzero(cover)[1].astype(np.int32)
+        return ArcSets(indptr, indices)
     # 预计算公式 6所需的参数
     # lambda = (f)^-1( (j-i)*t0 )
     def pre_inverse_count(self, arcs_manual_1:List, arcs_manual_2:List) -> Dict[Tuple[int, int], float]:
-        cap_coeff_1 = {}
-        cap_coeff_2 = {}
-        # 对第一个城市计算
-        for (i, j) in arcs_manual_1:
-            duration = (j - i) * self.cfg.t_0
-            # 这里调用反函数求解
-            max_load = self.inverse_function_1(duration)
-            cap_coeff_1[(i, j)] = max_load
-        # 对第二个城市计算
-        for (i, j) in arcs_manual_2:
-            duration = (j - i) * self.cfg.t_0
-            # 这里调用反函数求解
-            max_load = self.inverse_function_2(duration)
-            cap_coeff_2[(i, j)] = max_load
+        # 对两个城市分别一次性批量求解反函数, 仅在交给 Gurobi 前转回字典
+        max_load_1 = _inverse_batch(arcs_manual_1, self.cfg.t_0, self.cfg.service_a_1, self.cfg.service_b_1)
+        max_load_2 = _inverse_batch(arcs_manual_2, self.cfg.t_0, self.cfg.service_a_2, self.cfg.service_b_2)
+        cap_coeff_1 = dict(zip(arcs_manual_1, max_load_1.tolist()))
+        cap_coeff_2 = dict(zip(arcs_manual_2, max_load_2.tolist()))
 
         return cap_coeff_1, cap_coeff_2
-    
+
+
+# 按结构键缓存弧、集合与载重系数, 参数扫描中只有车队规模/成本变化时直接复用
+@lru_cache(maxsize=32)
+def _load_structural(key: StructuralKey):
+    return DataLoader(DeliveryConfig(**key._asdict()))._build_arc_structures()
+
+
+# (N, 2) 弧数组转为 Gurobi 索引所用的 (i, j) 元组列表
+def _arcs_to_list(arcs: np.ndarray) -> List[Tuple[int, int]]:
+    return list(zip(arcs[:, 0].tolist(), arcs[:, 1].tolist()))
+
+
+# 反函数的批量版本: 输入 (N, 2) 的弧数组, 输出 (N,) 的最大载重量
+# T = (j-i)*t0, u = (-b + sqrt(b^2 + 4aT)) / 2a, lambda = u^2
+def _inverse_batch(arcs, t0: float, a: float, b: float) -> np.ndarray:
+    arcs = np.asarray(arcs, dtype=np.int32).reshape(-1, 2)
+    T_val = (arcs[:, 1] - arcs[:, 0]) * t0
+    u = (-b + np.sqrt(b**2 + 4 * a * T_val)) / (2 * a)
+    return u**2
+
 @dataclass
 class OrderBatch:
     batch_id: int            # 对应 l
@@ -2,8 +2,8 @@ import pandas as pd
 import numpy as np
 import gurobipy as gp
 import json
-import random
 import os
+import multiprocessing
 import time
 from datetime import datetime
 from dataclasses import replace, asdict
@@ -18,31 +18,39 @@ from optimizer import Optimizer
 # 1. 随机订单生成器 (增加规模参数)
 # ==========================================
 def generate_random_orders(config: DeliveryConfig, num_orders=50, seed=42):
-    random.seed(seed)
-    np.random.seed(seed)
+    # 所有随机量一次性批量抽取, 循环中只负责组装 OrderBatch
+    rng = np.random.default_rng(seed)
     
     pos_orders = {}
     neg_orders = {}
     all_orders = {}
+
+    # 增加随机性：长短途混合
+    min_duration = config.travel_time_periods + 1
+    max_start = config.T - min_duration - 1
+
+    flows = np.where(rng.random(num_orders) > 0.5, "+", "-").tolist()
+    if max_start <= 0: # 防止T设置过小导致报错
+        starts = [0] * num_orders
+        completions = [config.T] * num_orders
+    else:
+        starts = rng.integers(0, max_start + 1, size=num_orders)
+        # 结束时间 = 开始 + 行驶时间 + 随机缓冲(0-5个时间段)
+        buffers = rng.integers(0, 6, size=num_orders)
+        completions = np.minimum(config.T, starts + min_duration + buffers).tolist()
+        starts = starts.tolist()
+
+    # 需求量波动：小包裹(10-50) vs 大宗货物(100-300)
+    big = rng.random(num_orders) <= 0.3
+    quantities = np.where(
+        big,
+        rng.integers(100, 301, size=num_orders),
+        rng.integers(10, 51, size=num_orders)
+    ).tolist()
     
-    for l in range(1, num_orders + 1):
-        flow = "+" if random.random() > 0.5 else "-"
-        # 增加随机性：长短途混合
-        min_duration = config.travel_time_periods + 1
-        max_start = config.T - min_duration - 1
-        
-        if max_start <= 0: # 防止T设置过小导致报错
-            earliest_start = 0
-            latest_completion = config.T
-        else:
-            earliest_start = random.randint(0, max_start)
-            # 结束时间 = 开始 + 行驶时间 + 随机缓冲(0-5个时间段)
-            buffer = random.randint(0, 5)
-            latest_completion = min(config.T, earliest_start + min_duration + buffer)
-        
-        # 需求量波动：小包裹(10-50) vs 大宗货物(100-300)
-        quantity = random.randint(10, 50) if random.random() > 0.3 else random.randint(100, 300)
-        
+    for l, flow, quantity, earliest_start, latest_completion in zip(
+        range(1, num_orders + 1), flows, quantities, starts, completions
+    ):
         order = OrderBatch(
             batch_id=l,
             flow=flow,
@@ -63,49 +71,51 @@ def generate_random_orders(config: DeliveryConfig, num_orders=50, seed=42):
 # ==========================================
 # 2. 单次实验运行器 (增强版：增加详细日志)
 # ==========================================
-def run_single_experiment(experiment_id, config, orders_tuple):
-    start_time = time.time()
+# 弧、集合与载重系数只依赖结构参数, 在同一组结构参数的实验间复用
+def prepare_experiment_data(config, orders_tuple):
     pos, neg, all_ord = orders_tuple
-    
-    # 1. 数据加载
     loader = DataLoader(config)
-    # 注意：这里调用加上 list() 转换后的 generate_arcs_manual
-    m1, m2 = loader.generate_arcs_manual() 
-    auto = loader.generate_arcs_auto()
-    sets_m1, sets_m2, sets_auto = loader.generate_sets(m1, m2, auto)
-    epsilon = loader.generate_epsilon_sets(pos, neg, m1, m2)
-    coeff1, coeff2 = loader.pre_inverse_count(m1, m2)
+    m1, m2, auto, sets_m1, sets_m2, sets_auto, coeff1, coeff2 = loader.build_structural()
     
-    data = DeliveryData(
+    return DeliveryData(
         arcs_manual_1=m1, arcs_manual_2=m2, arcs_auto=auto,
         sets_manual_1=sets_m1, sets_manual_2=sets_m2, sets_auto=sets_auto,
         cap_coeff_1=coeff1, cap_coeff_2=coeff2,
-        pos_orders=pos, neg_orders=neg, all_orders=all_ord,
-        epsilon_sets=epsilon
+        pos_orders=pos, neg_orders=neg, all_orders=all_ord
     )
+
+# model_cache: 调用方持有的模型缓存 (见 Optimizer.build), 为 None 时每次重新建模
+def run_single_experiment(experiment_id, config, orders_tuple, threads=0, model_cache=None):
+    start_time = time.time()
+    pos, neg, all_ord = orders_tuple
+    
+    # 1. 数据加载
+    data = prepare_experiment_data(config, orders_tuple)
     
     # 2. 求解
-    opt = Optimizer(config, data)
-    opt.setup_variables()
-    opt.set_objective()
-    opt.set_constraints()
+    opt = Optimizer.build(config, data, cache=model_cache)
     
     # 设置求解时间限制 (防止大规模卡死)
     opt.model.setParam('TimeLimit', 500) # 5分钟限制
     opt.model.setParam('OutputFlag', 0)
+    opt.configure_solver(threads=threads)
+    # 建模 (缓存命中时只是更新系数) 与求解分开计时, 两列在每一行中含义一致
+    build_time = time.time() - start_time
+    solve_start = time.time()
     opt.model.optimize()
     
-    solve_time = time.time() - start_time
+    solve_time = time.time() - solve_start
     
     # 3. 结果提取
     result_summary = {
         "Exp_ID": experiment_id,
         "Status": opt.model.Status,
+        "Build_Time_Sec": round(build_time, 2),
         "Solve_Time_Sec": round(solve_time, 2),
         "Num_Orders": len(all_ord),
         # 记录关键参数
-        "Param_N_Auto": config.N_auto[1],
-        "Param_N_Manual": config.N_manual[1],
+        "Param_N_Auto": config.N_auto[0],
+        "Param_N_Manual": config.N_manual[0],
         "Param_Cost_Auto": config.cost_auto,
         # 结果指标
         "Total_Cost": None,
@@ -147,7 +157,7 @@ def run_single_experiment(experiment_id, config, orders_tuple):
                 "z_unserved": {k: v.X for k, v in opt.z_unserved.items() if v.X > 0.1}
             }
         }
-        print(f"Exp {experiment_id} | Orders={len(all_ord)} | Auto={config.N_auto[1]} | Cost={result_summary['Total_Cost']}")
+        print(f"Exp {experiment_id} | Orders={len(all_ord)} | Auto={config.N_auto[0]} | Cost={result_summary['Total_Cost']}")
     else:
         # 如果 SolCount == 0，说明连一个可行解都没找到
         print(f"  [失败] 未找到任何可行解。Gurobi 状态码: {opt.model.Status}")
@@ -155,6 +165,21 @@ def run_single_experiment(experiment_id, config, orders_tuple):
     
     return result_summary, detailed_log
 
+# 场景 A 并行求解时每个 Gurobi 进程可用的线程数, 避免多个进程超额占用 CPU
+SWEEP_GUROBI_THREADS = 2
+
+# 场景 A 工作进程自己的模型缓存: 参数扫描中订单固定, 同一进程内的实验只在第一次建模,
+# 之后只更新车队规模与成本. 只有 solve_one 使用, 其它实验不经过缓存
+_sweep_model_cache = {}
+
+# 进程池任务: params = (experiment_id, config, orders_tuple), 只返回汇总结果
+def solve_one(params):
+    experiment_id, config, orders_tuple = params
+    res, _ = run_single_experiment(
+        experiment_id, config, orders_tuple, threads=SWEEP_GUROBI_THREADS, model_cache=_sweep_model_cache
+    )
+    return res
+
 # ==========================================
 # 3. 实验场景运行器
 # ==========================================
@@ -179,24 +204,27 @@ if __name__ == "__main__":
         # 2. 生成所有组合 (3*3*2 = 18组实验)
         param_combinations = list(product(levels_n_auto, levels_cost_auto, levels_n_manual))
         
+        tasks = []
         for i, (n_auto, c_auto, n_manual) in enumerate(param_combinations):
             # 创建特定配置
             exp_cfg = replace(base_cfg, 
-                            N_auto={1: n_auto, 2: n_auto},
+                            N_auto=(n_auto, n_auto),
                             cost_auto=c_auto,
-                            N_manual={1: n_manual, 2: n_manual})
-            
-            # 运行
-            res, _ = run_single_experiment(f"A_{i+1}", exp_cfg, fixed_orders)
-            all_summaries.append(res)
+                            N_manual=(n_manual, n_manual))
+            tasks.append((f"A_{i+1}", exp_cfg, fixed_orders))
+        
+        # 运行: 各组实验互相独立, 用进程池并行求解 (结果顺序与参数组合一致)
+        processes = max(1, min(os.cpu_count() or 1, 6))
+        with multiprocessing.Pool(processes=processes) as pool:
+            all_summaries.extend(pool.map(solve_one, tasks))
     if experiment_type.strip() == "2":
     
         print("\n=== 开始场景 B: 大规模订单压力测试 ===")
         
         scale_levels = [100, 200, 500] # 测试 100 到 500 个订单
         base_cfg_scale = DeliveryConfig(
-            N_auto={1: 50, 2: 50},       # 增加车辆以应对大规模订单
-            N_manual={1: 100, 2: 100}
+            N_auto=(50, 50),       # 增加车辆以应对大规模订单
+            N_manual=(100, 100)
         )
         
         for i, n_orders in enumerate(scale_levels):
@@ -217,7 +245,7 @@ if __name__ == "__main__":
     
     # 调整列顺序，好看一点
     cols = ["Exp_ID", "Num_Orders", "Param_N_Auto", "Param_Cost_Auto", "Param_N_Manual", 
-            "Total_Cost", "Unserved_Rate", "Solve_Time_Sec", "Status"]
+            "Total_Cost", "Unserved_Rate", "Build_Time_Sec", "Solve_Time_Sec", "Status"]
     df = df[cols]
     
     df.to_csv(csv_filename, index=False)
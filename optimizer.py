@@ -3,16 +3,113 @@ from gurobipy import GRB
 from config import DeliveryConfig
 from data_loader import DeliveryData, DataLoader, OrderBatch
 from dataclasses import dataclass
+from functools import cached_property
 import pandas as pd
 import math
 import numpy as np
-from typing import List, Tuple, Dict
+import scipy.sparse as sp
+from typing import List, Tuple, Dict, Optional
+
+# 人工车辆弧记录: 起止时间、城市、方向(+1 为 "+", -1 为 "-")及约束(6)的载重系数
+ARC_RECORD = np.dtype([
+    ("i", np.int32), ("j", np.int32), ("city", np.int8), ("dir", np.int8), ("coeff", np.float64)
+])
 
 class Optimizer:
     def __init__(self, config: DeliveryConfig, data: DeliveryData):
         self.cfg = config
         self.data = data
         self.model = gp.Model("Intercity_Delivery_Optimization")
+        # 时间-弧覆盖矩阵只依赖弧集合, 在此建一次, 供约束(2)-(5)与初始解的车队检查共用
+        self.S_manual = {
+            1: _incidence_matrix(data.sets_manual_1, len(data.arcs_manual_1)),
+            2: _incidence_matrix(data.sets_manual_2, len(data.arcs_manual_2)),
+        }
+        self.S_auto = _incidence_matrix(data.sets_auto, len(data.arcs_auto))
+        self.auto_arcs = np.asarray(data.arcs_auto, dtype=np.int32).reshape(-1, 2)
+        # D[t, k] = 1 当且仅当自动驾驶弧 k 在 t 之前出发 (i < t)
+        self.D_auto = _cumulative_matrix(self.auto_arcs[:, 0], config.T, strict=True)
+        # 约束(2)(3)的系数矩阵: 同一条弧的两个方向共用一列覆盖, 展开为与按行优先展开的 x、y 直接相乘的形式,
+        # 避免稀疏矩阵再乘 x.sum(axis=1) 这样的 MLinExpr (gurobipy 对链式矩阵乘法很慢)
+        self.S_manual_flow = {city: sp.kron(S, np.ones((1, 2)), format="csr") for city, S in self.S_manual.items()}
+        self.S_auto_flow = sp.kron(self.S_auto, np.ones((1, 2)), format="csr")
+
+    # 取得可直接求解的模型. 默认每次完整建模; 调用方传入自己持有的 cache (结构签名 -> Optimizer) 时,
+    # 签名相同则复用其中的模型 (保留上一次的基与可行解), 只更新右端项与目标系数.
+    # 复用的是同一个对象, 因此 cache 只应在顺序执行、逐个取完结果的实验循环 (如参数扫描) 中使用
+    @classmethod
+    def build(cls, config: DeliveryConfig, data: DeliveryData,
+              cache: Optional[Dict[tuple, "Optimizer"]] = None) -> "Optimizer":
+        key = _model_signature(config, data) if cache is not None else None
+        opt = cache.get(key) if cache is not None else None
+        if opt is not None:
+            opt.update_parameters(config)
+            opt.update_orders(data)
+            opt.set_mip_start()
+            return opt
+        opt = cls(config, data)
+        opt.setup_variables()
+        opt.set_objective()
+        opt.set_constraints()
+        opt.set_mip_start()
+        if cache is not None:
+            cache[key] = opt
+        return opt
+
+    # 更新车队规模 (约束(2)-(5)的右端项) 与车辆单位成本 (x、y 的目标系数), 模型结构不变
+    def update_parameters(self, config: DeliveryConfig):
+        self.cfg = config
+        for city, constr in self.fleet_manual_constrs.items():
+            constr.RHS = config.N_manual[city - 1]
+        self.fleet_auto_constr.RHS = sum(config.N_auto)
+        self.balance_constrs[0].RHS = -config.N_auto[0]
+        self.balance_constrs[1].RHS = config.N_auto[1]
+        self.x_manual_mv.Obj = self._manual_arc_cost(config).reshape(self.x_manual_mv.shape)
+        self.y_auto_mv.Obj = config.cost_auto * config.travel_time_periods * config.t_0
+
+    # 求解参数: 根节点松弛用内点法 (Method=2), MIPFocus=1 侧重尽快找到可行解,
+    # 分支树内存超过 NodefileStart (GB) 后把节点写入磁盘, 避免大规模实验内存耗尽
+    # 容量约束(6)(7) sum_l g <= coeff * x 是带固定费用的背包结构, 对其有效的 MIR、覆盖、流覆盖与流路割平面
+    # Gurobi 都能自行分离, 因此只调高这些割平面的力度 (cuts=2 为激进), 不再在回调中手动添加覆盖不等式
+    def configure_solver(self, method=2, presolve=-1, threads=0, mipgap=1e-4, heuristics=0.1, cuts=2):
+        self.model.setParam('Method', method)
+        self.model.setParam('Presolve', presolve)
+        self.model.setParam('Threads', threads) # 0 表示由 Gurobi 自行决定
+        self.model.setParam('MIPGap', mipgap)
+        self.model.setParam('Heuristics', heuristics)
+        self.model.setParam('MIPFocus', 1)
+        self.model.setParam('NodefileStart', 0.5)
+        for cut_param in ('Cuts', 'MIRCuts', 'CoverCuts', 'FlowCoverCuts', 'FlowPathCuts'):
+            self.model.setParam(cut_param, cuts)
+        # set_mip_start 给定了全部整数变量, 只需固定整数后求解一次 LP 补全累计辅助变量
+        self.model.setParam('StartNodeLimit', 0)
+
+    # 换一批结构相同 (编号、方向、时间窗一致) 的订单: 需求量与惩罚只出现在约束(11)的右端项
+    # 与 z 的目标系数中, 原地更新后重新求解, Gurobi 会沿用上一次的基
+    def update_orders(self, data: DeliveryData):
+        self.data = data
+        self._set_order_arrays()
+        self.z_unserved_mv.Obj = self.order_penalty
+        for constr in self.demand_constrs.values():
+            constr.RHS = self.order_qty
+
+    # g_manual 的 (i, j, city, flow, l) 键与按键索引的视图; 建模只用整数下标, 视图在第一次访问时才生成
+    @cached_property
+    def g_manual_keys(self) -> List[tuple]:
+        return [
+            self.arcs_indices[k] + (self.order_ids[q],)
+            for k, q in zip(self.g_manual_arc.tolist(), self.g_manual_order.tolist())
+        ]
+
+    @cached_property
+    def g_manual(self) -> gp.tupledict:
+        return _tupledict_view(self.g_manual_keys, self.g_manual_mv)
+
+    # 按订单位置排列的需求量与缺货惩罚
+    def _set_order_arrays(self):
+        orders = [self.data.all_orders[l] for l in self.order_ids]
+        self.order_qty = np.array([o.quantity for o in orders], dtype=np.float64)
+        self.order_penalty = np.array([o.penalty_lost for o in orders], dtype=np.float64)
 
     # 设置变量
     def setup_variables(self):
@@ -27,183 +124,176 @@ class Optimizer:
         for (i, j) in self.data.arcs_manual_2:
             for flow in self.flow:
                 self.arcs_indices.append((i, j, 2, flow))
-                
-        # 创建变量 x
-        self.x_manual = self.model.addVars(self.arcs_indices, vtype=GRB.INTEGER, name="x_manual")
-        # 创建变量 y 
-        self.y_auto = self.model.addVars(
-            self.data.arcs_auto, self.flow, vtype=GRB.INTEGER, name="y_auto"
+
+        # 与 arcs_indices 一一对应的弧记录表 (见 ARC_RECORD), 约束构建时按弧位置 k 直接索引
+        self.arc_table = np.array([
+            (i, j, city, 1 if flow == "+" else -1,
+             (self.data.cap_coeff_1 if city == 1 else self.data.cap_coeff_2)[(i, j)])
+            for (i, j, city, flow) in self.arcs_indices
+        ], dtype=ARC_RECORD)
+
+        # 创建变量 x: 矩阵变量, 第 k 行为 arcs_manual_1 + arcs_manual_2 中的第 k 条弧, 两列对应方向 (+, -)
+        self.x_manual_mv = self.model.addMVar(
+            (len(self.data.arcs_manual_1) + len(self.data.arcs_manual_2), len(self.flow)),
+            vtype=GRB.INTEGER, name="x_manual"
+        )
+        # 按 (i, j, city, flow) 索引的视图, 行优先展开顺序与 arcs_indices 一致
+        self.x_manual = _tupledict_view(self.arcs_indices, self.x_manual_mv)
+        # 创建变量 y: 第 k 行为 arcs_auto 中的第 k 条弧, 两列对应方向 (+, -)
+        self.y_auto_mv = self.model.addMVar(
+            (len(self.data.arcs_auto), len(self.flow)), vtype=GRB.INTEGER, name="y_auto"
+        )
+        self.y_auto = _tupledict_view(
+            [(i, j, flow) for (i, j) in self.data.arcs_auto for flow in self.flow], self.y_auto_mv
         )
         # 创建变量 g
-        self.g_manual = self.model.addVars(
-            self.arcs_indices, self.data.all_orders.keys(), vtype=GRB.INTEGER, name= "g_manual"
+        # g、z 为连续的货量变量, 只有车辆数 x、y 取整数
+        # 每个方向只承载同向订单: + 弧只对应正向订单, - 弧只对应反向订单
+        # 订单编号 l 与其在订单维度上的位置 q (all_orders 的遍历顺序), 以及按位置排列的需求量、惩罚与方向(+1/-1)
+        self.order_ids = list(self.data.all_orders.keys())
+        self._set_order_arrays()
+        self.order_flow = np.array(
+            [1 if self.data.all_orders[l].flow == "+" else -1 for l in self.order_ids], dtype=np.int8
         )
-        self.g_auto = self.model.addVars(
-            self.data.arcs_auto, self.flow, self.data.all_orders.keys(), vtype=GRB.INTEGER, name = "g_auto"
+        order_ids = np.array(self.order_ids, dtype=object)
+        self.orders_by_flow = {
+            "+": order_ids[self.order_flow > 0].tolist(),
+            "-": order_ids[self.order_flow < 0].tolist(),
+        }
+        # 只为满足时间窗的同向 (弧, 订单) 组合创建 g_manual, 不满足时间窗的组合 (原 epsilon 集合) 不建变量(原约束(8))
+        # 在 (弧位置 k, 订单位置 q) 网格上整体判断, 这里是时间窗规则的唯一实现:
+        # 起点城市的弧不能早于最早出发时间 (i >= s_l), 终点城市的弧不能晚于最晚完成时间 (j <= e_l)
+        order_start = np.array([self.data.all_orders[l].earliest_start for l in self.order_ids])
+        order_end = np.array([self.data.all_orders[l].latest_completion for l in self.order_ids])
+        arc_i, arc_j = self.arc_table["i"][:, None], self.arc_table["j"][:, None]
+        arc_dir = self.arc_table["dir"]
+        # 弧是否位于同向订单的起点城市: + 方向起点为城市 1, - 方向起点为城市 2
+        at_origin = self.arc_table["city"] == np.where(arc_dir > 0, 1, 2)
+        allowed = (arc_dir[:, None] == self.order_flow[None, :]) & np.where(
+            at_origin[:, None], arc_i >= order_start[None, :], arc_j <= order_end[None, :]
         )
+        # 第 p 个 g_manual 位于弧 g_manual_arc[p], 属于订单 g_manual_order[p] (按弧、再按订单排列)
+        self.g_manual_arc, self.g_manual_order = np.nonzero(allowed)
+        self.g_manual_mv = self.model.addMVar(len(self.g_manual_arc), vtype=GRB.CONTINUOUS, name="g_manual")
+        # g_auto: 每个方向一个 (自动驾驶弧, 同向订单) 二维矩阵变量
+        self.g_auto_mv = {
+            flow: self.model.addMVar(
+                (len(self.data.arcs_auto), len(self.orders_by_flow[flow])),
+                vtype=GRB.CONTINUOUS, name=f"g_auto{flow}"
+            )
+            for flow in self.flow
+        }
+        self.g_auto = gp.tupledict()
+        for flow in self.flow:
+            self.g_auto.update(_tupledict_view(
+                [(i, j, flow, l) for (i, j) in self.data.arcs_auto for l in self.orders_by_flow[flow]],
+                self.g_auto_mv[flow]
+            ))
         # 创建变量 z
-        self.z_unserved = self.model.addVars(
-            self.data.all_orders.keys(), vtype=GRB.INTEGER, name="z_unserved"
-        )
+        self.z_unserved_mv = self.model.addMVar(len(self.order_ids), vtype=GRB.CONTINUOUS, name="z_unserved")
+        self.z_unserved = _tupledict_view(self.order_ids, self.z_unserved_mv)
 
     def set_objective(self):
         # 未服务惩罚
-        self.penalty_unserved = gp.quicksum(
-            order.penalty_lost * self.z_unserved[l] for l, order in self.data.all_orders.items()
-        )    
-        # 人工车辆成本
-        self.cost_manual = gp.quicksum(
-            self.cfg.cost_manual * self.cfg.t_0 * (j-i) * self.x_manual[i, j, city, flow] 
-            for (i, j, city, flow) in self.arcs_indices
-        )
+        self.penalty_unserved = self.order_penalty @ self.z_unserved_mv
+        # 人工车辆成本: 单车成本向量与按 arcs_indices 展开的 x 做内积
+        self.cost_manual = self._manual_arc_cost(self.cfg) @ self.x_manual_mv.reshape(-1)
         # 自动驾驶车辆成本
-        self.cost_auto = self.cfg.cost_auto * self.cfg.travel_time_periods * self.cfg.t_0 * self.y_auto.sum()
+        self.cost_auto = self.cfg.cost_auto * self.cfg.travel_time_periods * self.cfg.t_0 * self.y_auto_mv.sum()
         # 总目标函数
         self.model.setObjective(
             self.penalty_unserved + self.cost_manual + self.cost_auto,
             GRB.MINIMIZE
         )
         
+    # 每条人工弧 (按 arcs_indices 顺序) 上一辆车的成本 cost_manual * t_0 * (j - i)
+    def _manual_arc_cost(self, config: DeliveryConfig) -> np.ndarray:
+        return config.cost_manual * config.t_0 * (self.arc_table["j"] - self.arc_table["i"]).astype(np.float64)
+
     def set_constraints(self):
         # 建立第一个约束(2)
-        for t in range(self.cfg.T):
-            for city in [1, 2]:
-                # 1. 获取该城市在时间 t 的活跃弧集合 S^k(t)
-                active_arcs = (
-                    self.data.sets_manual_1[t] if city == 1 
-                    else self.data.sets_manual_2[t]
-                )
-                
-                # 2. 计算当前活跃车辆总数
-                active_vehicles = gp.quicksum(
-                    self.x_manual[i, j, city, flow]
-                    for (i, j) in active_arcs
-                    for flow in self.flow
-                )
-                
-                # 3. 添加约束: 活跃车辆数 <= 该城市的车队上限
-                self.model.addConstr(
-                    active_vehicles <= self.cfg.N_manual[city],
-                    name=f"(2)Fleet_Capacity_InnerCity{city}_Time{t}"
-                )
-        # 建立第二个约束(3)
-        for t in range(self.cfg.T):        
-            # 1. 计算当前活跃车辆总数
-            active_vehicles = gp.quicksum(
-                self.y_auto[i, j, flow]
-                for (i, j) in self.data.sets_auto[t]
-                for flow in self.flow
-            )
-            
-            # 2. 添加约束: 活跃车辆数 <= 该城市的车队上限
-            self.model.addConstr(
-                active_vehicles <= sum(self.cfg.N_auto.values()),
-                name=f"(3)Fleet_Capacity_InterCity_Time{t}"
+        # S^k 为 (T, |A^k|) 的时间-弧覆盖矩阵, 每个城市一次性加入 T 行
+        n_1 = len(self.data.arcs_manual_1)
+        # 保留车队约束(2)-(5)的引用, 复用模型时直接修改右端项
+        self.fleet_manual_constrs = {}
+        for city, rows in ((1, slice(0, n_1)), (2, slice(n_1, None))):
+            # 添加约束: 活跃车辆数 <= 该城市的车队上限
+            self.fleet_manual_constrs[city] = self.model.addConstr(
+                self.S_manual_flow[city] @ self.x_manual_mv[rows, :].reshape(-1) <= self.cfg.N_manual[city - 1],
+                name=f"(2)Fleet_Capacity_InnerCity{city}"
             )
+        # 建立第二个约束(3)
+        self.fleet_auto_constr = self.model.addConstr(
+            self.S_auto_flow @ self.y_auto_mv.reshape(-1) <= sum(self.cfg.N_auto),
+            name="(3)Fleet_Capacity_InterCity"
+        )
         # 建立第三、四个约束(4)(5)
-        for t in range(self.cfg.T):
-            # ㊣流计算
-            postive_flow = gp.quicksum(
-                self.y_auto[i, j, "+"]
-                for (i, j) in self.data.arcs_auto if i < t
-            )
-            # 逆流计算
-            negative_flow = gp.quicksum(
-                self.y_auto[i, j, "-"]
-                for (i, j) in self.data.arcs_auto if i < t
-            )
-            # 添加约束：㊣流 - 逆流 + \hat{N}^1 \geq 0
+        # 按出发时间累计的净流量, T 行一次加入
+        # ㊣流 - 逆流
+        net_flow = self.D_auto @ self.y_auto_mv[:, 0] - self.D_auto @ self.y_auto_mv[:, 1]
+        # 添加约束：㊣流 - 逆流 + \hat{N}^1 \geq 0
+        positive_balance = self.model.addConstr(
+            net_flow >= -self.cfg.N_auto[0],
+            name="(4)Intercity_Postive_Flow_Balance"
+        )
+        # 添加约束：㊣流 - 逆流 + \hat{N}^2 \geq 0
+        negative_balance = self.model.addConstr(
+            net_flow <= self.cfg.N_auto[1],
+            name="(5)Intercity_Negtive_Flow_Balance"
+        )
+        self.balance_constrs = (positive_balance, negative_balance)
+        # 建立第五个约束(6)
+        # 每条弧只加入汇总容量约束 sum_l g <= x * coeff; 单个订单的 g_l <= x * coeff 由汇总约束与 g >= 0 蕴含,
+        # 不必逐订单加入, 也不需要以惰性约束(LazyConstraints)的方式在回调中分离. 约束(7)同理
+        # G[k, p] = 1 当且仅当 g_manual 第 p 个变量位于弧 k 上, 全部弧的容量约束一次加入
+        G = sp.csr_matrix(
+            (np.ones(len(self.g_manual_arc)), (self.g_manual_arc, np.arange(len(self.g_manual_arc)))),
+            shape=(len(self.arcs_indices), len(self.g_manual_arc))
+        )
+        self.model.addConstr(
+            G @ self.g_manual_mv <= self.arc_table["coeff"] * self.x_manual_mv.reshape(-1),
+            name="(6)Manual_Cap"
+        )
+
+        # 建立第六个约束(7)
+        # 原模型中的约束应该有求和: 每条自动驾驶弧、每个方向上同向订单的货量之和
+        # 只保留汇总形式; 逐订单的 g_auto <= y * capacity_auto 右端相同, 由汇总约束与 g >= 0 蕴含, 不再重复加入
+        for col, flow in enumerate(self.flow):
             self.model.addConstr(
-                postive_flow - negative_flow + self.cfg.N_auto[1] >= 0,
-                name=f"(4)Intercity_Postive_Flow_Balance_Time{t}"
+                self.g_auto_mv[flow].sum(axis=1) <= self.cfg.capacity_auto * self.y_auto_mv[:, col],
+                name=f"(7)Auto_Capacity_Total{flow}"
             )
-            # 添加约束：㊣流 - 逆流 + \hat{N}^2 \geq 0
+        # 建立第八、九个约束(9)(10)
+        # 累计货量用辅助变量递推 (见 _add_cumulative), 换乘约束每行只剩两个非零元
+        gm_arcs = self.arc_table[self.g_manual_arc]
+        gm_i, gm_j, gm_city, gm_dir = gm_arcs["i"], gm_arcs["j"], gm_arcs["city"], gm_arcs["dir"]
+        for flow in self.flow:
+            # 正向 (+): City 1 (Origin) -> Auto -> City 2 (Dest)
+            # 反向 (-): City 2 (Origin) -> Auto -> City 1 (Dest)
+            origin_city, dest_city = (1, 2) if flow == "+" else (2, 1)
+            # 该方向的 g_auto, 展开后第 (k, p) 项对应弧 k、第 p 个同向订单
+            n_orders = len(self.orders_by_flow[flow])
+            g_auto_flow = self.g_auto_mv[flow].reshape(-1)
+            auto_i = np.repeat(self.auto_arcs[:, 0], n_orders)
+            auto_j = np.repeat(self.auto_arcs[:, 1], n_orders)
+
+            direction = 1 if flow == "+" else -1
+            origin = np.flatnonzero((gm_city == origin_city) & (gm_dir == direction))
+            dest = np.flatnonzero((gm_city == dest_city) & (gm_dir == direction))
+
+            auto_departure_origin = self._add_cumulative(auto_i, g_auto_flow, f"AD_origin{flow}")
+            manual_arrival_origin = self._add_cumulative(gm_j[origin], self.g_manual_mv[origin], f"MA_origin{flow}")
             self.model.addConstr(
-                negative_flow - postive_flow + self.cfg.N_auto[2] >= 0,
-                name=f"(5)Intercity_Negtive_Flow_Balance_Time{t}"
+                auto_departure_origin <= manual_arrival_origin,
+                name=f"(9)transfer_origin_dir{flow}"
             )
-        # 建立第五个约束(6)
-        # 建立第五个约束(6)
-        for (i, j, city, flow) in self.arcs_indices:
-            coeff_dict = (self.data.cap_coeff_1 if city == 1 else self.data.cap_coeff_2)
-            orders = (self.data.pos_orders if flow == "+" else self.data.neg_orders)
-            
-            lhs = gp.quicksum(
-                self.g_manual[i, j, city, flow, l] 
-                for l in orders.keys()
+            # 这里是约束(10)
+            auto_arrival_dest = self._add_cumulative(auto_j, g_auto_flow, f"AA_dest{flow}")
+            manual_departure_dest = self._add_cumulative(gm_i[dest], self.g_manual_mv[dest], f"MD_dest{flow}")
+            self.model.addConstr(
+                auto_arrival_dest >= manual_departure_dest,
+                name=f"(10)transfer_dest_dir{flow}"
             )
-            rhs = self.x_manual[i, j, city, flow] * coeff_dict[(i, j)]
-            
-            self.model.addConstr(lhs <= rhs, name=f"(6)Manual_Cap_{city}_{flow}_{i}_{j}")
-
-        # 建立第六个约束(7)
-        # 原模型中的约束应该有求和
-        self.model.addConstrs(
-            (gp.quicksum(self.g_auto[i, j, flow, l] for l in (self.data.pos_orders if flow == "+" else self.data.neg_orders))
-             <= self.y_auto[i, j, flow] * self.cfg.capacity_auto
-            for (i, j) in self.data.arcs_auto
-            for flow in self.flow),
-            name="(7)Auto_Capacity_Total"
-        )
-        # 建立第七个约束(8)
-        # 建立第七个约束(8)
-        self.model.addConstrs(
-            (self.g_manual[i, j, city, flow, l] == 0  
-            for (i, j, city, flow, l) in self.data.epsilon_sets 
-            ),
-            name=f"(8)Time_Window_Violation"
-        )
-        # 建立第八、九个约束(9)(10)
-        for t in range(self.cfg.T):  
-            for flow in self.flow:
-                if flow == "+":
-                    # 正向 (+): City 1 (Origin) -> Auto -> City 2 (Dest)
-                    orders = self.data.pos_orders
-                    arcs_manual_origin = self.data.arcs_manual_1 
-                    arcs_manual_dest   = self.data.arcs_manual_2  
-                else:
-                    # 反向 (-): City 2 (Origin) -> Auto -> City 1 (Dest)
-                    orders = self.data.neg_orders
-                    arcs_manual_origin = self.data.arcs_manual_2
-                    arcs_manual_dest   = self.data.arcs_manual_1
-
-                auto_departure_origin = gp.quicksum(
-                    self.g_auto[i, j, flow, l]
-                    for (i, j) in self.data.arcs_auto
-                    for l in orders.keys()
-                    if i <= t
-                )
-
-                manual_arrival_origin = gp.quicksum(
-                    self.g_manual[i, j, (1 if flow == "+" else 2), flow, l] 
-                    for (i, j) in arcs_manual_origin
-                    for l in orders.keys()
-                    if j <= t
-                )
-
-                self.model.addConstr(
-                    auto_departure_origin <= manual_arrival_origin,
-                    name=f"(9)transfer_origin_dir{flow}_t{t}"
-                )
-                # 这里是约束(10)
-                auto_arrival_dest = gp.quicksum(
-                    self.g_auto[i, j, flow, l]
-                    for (i, j) in self.data.arcs_auto
-                    for l in orders.keys()
-                    if j <= t
-                )
-
-                manual_departure_dest = gp.quicksum(
-                    self.g_manual[i, j, (2 if flow == "+" else 1), flow, l] 
-                    for (i, j) in arcs_manual_dest
-                    for l in orders.keys()
-                    if i <= t
-                )
-
-                self.model.addConstr(
-                    auto_arrival_dest >= manual_departure_dest,
-                    name=f"(10)transfer_dest_dir{flow}_t{t}"
-                )
         # 建立第十个约束(11)
         """ self.model.addConstrs(
             (gp.quicksum(
@@ -216,15 +306,173 @@ class Optimizer:
             name="unserved_passenger_volume"
         )
          """
-        for k in [1, 2]: 
-            self.model.addConstrs(
-                (gp.quicksum(
-    
-                    self.g_manual[i, j, k, self.data.all_orders[l].flow, l]
-                    for (i, j) in (self.data.arcs_manual_1 if k == 1 else self.data.arcs_manual_2)
-                 ) == self.data.all_orders[l].quantity - self.z_unserved[l]
-                 
-                 for l in self.data.all_orders.keys()),
-                
+        # 每个城市一个 (订单, g_manual) 关联矩阵 A^k: A^k[q, p] = 1 当且仅当第 p 个 g_manual 位于城市 k、属于第 q 个订单
+        # 约束 A^k @ g + z = quantity 一次加入全部订单; 保留约束引用, 换一批订单时只改右端项
+        n_g = len(self.g_manual_arc)
+        self.demand_constrs = {}
+        for k in [1, 2]:
+            cols = np.flatnonzero(gm_city == k)
+            A = sp.csr_matrix(
+                (np.ones(len(cols)), (self.g_manual_order[cols], cols)),
+                shape=(len(self.order_ids), n_g)
+            )
+            self.demand_constrs[k] = self.model.addConstr(
+                A @ self.g_manual_mv + self.z_unserved_mv == self.order_qty,
                 name=f"Demand_Conservation_City{k}"
-            )            
+            )
+
+    # 贪心构造初始可行解 (MIP start): 订单按缺货惩罚从大到小依次尝试
+    # 起点城市人工弧 -> 自动驾驶弧 -> 终点城市人工弧, 三段在时间上首尾相接, 换乘约束(9)(10)因此自然满足;
+    # 只有新增车辆成本低于缺货惩罚且车队约束(2)-(5)仍成立时才整单接受, 否则整单记为未服务
+    def set_mip_start(self):
+        cfg = self.cfg
+        n_1 = len(self.data.arcs_manual_1)
+        fleet_manual = [
+            (self.S_manual[1], slice(0, n_1), cfg.N_manual[0]),
+            (self.S_manual[2], slice(n_1, None), cfg.N_manual[1]),
+        ]
+        auto_arcs = self.auto_arcs
+        # 贪心循环中反复用到的不变量先绑定为局部变量
+        S_auto, D_auto = self.S_auto, self.D_auto
+        N_auto_total, N_auto_pos, N_auto_neg = sum(cfg.N_auto), cfg.N_auto[0], cfg.N_auto[1]
+        capacity_auto = cfg.capacity_auto
+        x_shape = self.x_manual_mv.shape
+
+        def fleet_ok(x, y):
+            net_flow = D_auto @ (y[:, 0] - y[:, 1])
+            return (
+                all((S @ x[rows].sum(axis=1) <= limit).all() for S, rows, limit in fleet_manual)
+                and (S_auto @ y.sum(axis=1) <= N_auto_total).all()
+                and (net_flow >= -N_auto_pos).all()
+                and (net_flow <= N_auto_neg).all()
+            )
+
+        # 人工弧按 arcs_indices 展开的载重、单车载重上限与单车成本
+        arc_i, arc_j, arc_coeff = self.arc_table["i"], self.arc_table["j"], self.arc_table["coeff"]
+        arc_cost = self._manual_arc_cost(cfg)
+        load_manual = np.zeros(len(self.arcs_indices))
+        # 自动驾驶弧载重, 两列对应方向 (+, -)
+        load_auto = np.zeros((len(auto_arcs), len(self.flow)))
+        auto_cost = cfg.cost_auto * cfg.travel_time_periods * cfg.t_0
+
+        g_manual_arc = self.g_manual_arc
+        # 按 (订单位置 q, 城市) 分组的 g_manual 下标: 组号 2q + (city - 1), 第 c 组为 by_group[bounds[c]:bounds[c + 1]]
+        group = 2 * self.g_manual_order + (self.arc_table["city"][g_manual_arc] - 1)
+        by_group = np.argsort(group, kind="stable")
+        bounds = np.searchsorted(group[by_group], np.arange(2 * len(self.order_ids) + 1))
+
+        g_manual = np.zeros(len(g_manual_arc))
+        g_auto = {flow: np.zeros(self.g_auto_mv[flow].shape) for flow in self.flow}
+        z = self.order_qty.copy()
+        # 订单在同向订单中的位置, 即其在 g_auto 第二维上的下标
+        flow_rank = np.zeros(len(self.order_ids), dtype=np.int64)
+        for direction in (1, -1):
+            same = self.order_flow == direction
+            flow_rank[same] = np.arange(same.sum())
+
+        flows, order_qty, order_penalty = self.flow, self.order_qty, self.order_penalty
+        for q in np.argsort(-order_penalty, kind="stable"):
+            quantity = order_qty[q]
+            col = 0 if self.order_flow[q] > 0 else 1
+            flow = flows[col]
+            origin_city, dest_city = (1, 2) if flow == "+" else (2, 1)
+            c_o, c_d = 2 * q + origin_city - 1, 2 * q + dest_city - 1
+            origin = by_group[bounds[c_o]:bounds[c_o + 1]]
+            dest = by_group[bounds[c_d]:bounds[c_d + 1]]
+            if quantity <= 0 or len(origin) == 0 or len(dest) == 0 or len(auto_arcs) == 0:
+                continue
+            k_o, k_d = g_manual_arc[origin], g_manual_arc[dest]
+            cost_o = _marginal_cost(load_manual[k_o], quantity, arc_coeff[k_o], arc_cost[k_o])
+            cost_d = _marginal_cost(load_manual[k_d], quantity, arc_coeff[k_d], arc_cost[k_d])
+            cost_a = _marginal_cost(load_auto[:, col], quantity, capacity_auto, auto_cost)
+            # 对每条自动驾驶弧 a, 选其出发前到达的最便宜起点弧, 以及其到达后出发的最便宜终点弧
+            cost_oa = np.where(arc_j[k_o][:, None] <= auto_arcs[None, :, 0], cost_o[:, None], np.inf)
+            cost_ad = np.where(arc_i[k_d][:, None] >= auto_arcs[None, :, 1], cost_d[:, None], np.inf)
+            best_o, best_d = cost_oa.argmin(axis=0), cost_ad.argmin(axis=0)
+            total = cost_oa.min(axis=0) + cost_a + cost_ad.min(axis=0)
+
+            for a in np.argsort(total, kind="stable"):
+                if not total[a] < order_penalty[q] * quantity:
+                    break
+                p_o, p_d = origin[best_o[a]], dest[best_d[a]]
+                load_manual[[g_manual_arc[p_o], g_manual_arc[p_d]]] += quantity
+                load_auto[a, col] += quantity
+                x = _vehicles(load_manual, arc_coeff).reshape(x_shape)
+                y = _vehicles(load_auto, capacity_auto)
+                if fleet_ok(x, y):
+                    g_manual[[p_o, p_d]] = quantity
+                    g_auto[flow][a, flow_rank[q]] = quantity
+                    z[q] = 0.0
+                    break
+                load_manual[[g_manual_arc[p_o], g_manual_arc[p_d]]] -= quantity
+                load_auto[a, col] -= quantity
+
+        self.x_manual_mv.Start = _vehicles(load_manual, arc_coeff).reshape(x_shape)
+        self.y_auto_mv.Start = _vehicles(load_auto, capacity_auto)
+        self.g_manual_mv.Start = g_manual
+        for flow in self.flow:
+            self.g_auto_mv[flow].Start = g_auto[flow]
+        self.z_unserved_mv.Start = z
+
+    # 累计量辅助变量 C[t] = sum_{times[k] <= t} g[k], 以递推 C[t] = C[t-1] + sum_{times[k] = t} g[k] 定义
+    # 每个 g 只在其发生时段出现一次, 非零元为 O(T + n) 而不是 O(T * n)
+    def _add_cumulative(self, times, g, name: str):
+        T = self.cfg.T
+        C = self.model.addMVar(T, vtype=GRB.CONTINUOUS, name=name)
+        diff = sp.eye(T, format="csr") - sp.eye(T, k=-1, format="csr")
+        self.model.addConstr(diff @ C == _event_matrix(times, T) @ g, name=f"{name}_def")
+        return C
+
+
+# 模型的结构签名: 决定变量与约束矩阵的结构参数, 以及订单的编号、方向与时间窗
+# 车队规模、车辆单位成本、订单需求量与惩罚不在签名中, 它们只影响右端项与目标系数,
+# 由 update_parameters / update_orders 更新
+def _model_signature(config: DeliveryConfig, data: DeliveryData) -> tuple:
+    orders = tuple(
+        (l, o.flow, o.earliest_start, o.latest_completion)
+        for l, o in data.all_orders.items()
+    )
+    return DataLoader(config).structural_key(), config.capacity_auto, orders
+
+
+# 装载 load 所需的车辆数 ceil(load / capacity), 先舍入以免浮点误差多算一辆
+def _vehicles(load, capacity):
+    return np.ceil(np.round(np.asarray(load, dtype=np.float64) / capacity, 9))
+
+
+# 在已有载重 load 上再装 quantity 时新增车辆的成本
+def _marginal_cost(load, quantity: float, capacity, unit_cost):
+    added = _vehicles(load + quantity, capacity) - _vehicles(load, capacity)
+    return added * unit_cost
+
+
+# 按给定键顺序为矩阵变量建立 tupledict 视图 (MVar 按行优先展开)
+def _tupledict_view(keys, mvar) -> gp.tupledict:
+    return gp.tupledict(zip(keys, mvar.reshape(-1).tolist()))
+
+
+# 由 S(t) 的 CSR 下标构造 (T, n_arcs) 的 0/1 覆盖矩阵
+def _incidence_matrix(arc_sets, n_arcs: int) -> sp.csr_matrix:
+    T = len(arc_sets.indptr) - 1
+    return sp.csr_matrix(
+        (np.ones(len(arc_sets.indices)), arc_sets.indices, arc_sets.indptr),
+        shape=(T, n_arcs)
+    )
+
+
+# 按时间累计的关联矩阵 A (T, n): A[t, k] = 1 当且仅当 times[k] <= t (strict 时为 times[k] < t)
+# 按时间排序后第 t 行恰为一个前缀, 前缀长度由 searchsorted 给出
+def _cumulative_matrix(times, T: int, strict: bool = False) -> sp.csr_matrix:
+    times = np.asarray(times, dtype=np.int64)
+    order = np.argsort(times, kind="stable")
+    counts = np.searchsorted(times[order], np.arange(T), side="left" if strict else "right")
+    indptr = np.concatenate([[0], np.cumsum(counts)])
+    indices = np.concatenate([order[:c] for c in counts])
+    return sp.csr_matrix((np.ones(indptr[-1]), indices, indptr), shape=(T, len(times)))
+
+
+# 事件矩阵 E (T, n): E[t, k] = 1 当且仅当 times[k] = t; times 超出 [0, T) 的列为空
+def _event_matrix(times, T: int) -> sp.csr_matrix:
+    times = np.asarray(times, dtype=np.int64)
+    cols = np.flatnonzero((times >= 0) & (times < T))
+    return sp.csr_matrix((np.ones(len(cols)), (times[cols], cols)), shape=(T, len(times)))